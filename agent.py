@@ -1,11 +1,34 @@
 import os
+import codecs
 import sys
 import time
-import requests
+import asyncio
+import aiohttp
 import re
-from typing import List, Dict, Any, Optional
+import hashlib
+import unicodedata
+import functools
+import inspect
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import List, Dict, Any, Optional, Callable
 from urllib.parse import urlparse
+import orjson
+import diskcache
+from aiolimiter import AsyncLimiter
+from cachetools import TTLCache
 from dotenv import load_dotenv
+from http_session import client_session
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+except ImportError:
+    HTMLParser = None
+try:
+    import lxml.html as lxml_html
+except ImportError:
+    lxml_html = None
 
 # Load .env
 load_dotenv()
@@ -14,7 +37,199 @@ SERPER_API_KEY = os.getenv("SERPER_API_KEY")
 
 # Politeness settings
 REQUEST_DELAY = 0.8
-MAX_RETRIES = 2
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.5
+MAX_BACKOFF = 30.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_CALLS = 60  # per host, per RATE_LIMIT_PERIOD seconds
+RATE_LIMIT_PERIOD = 60
+MAX_CONCURRENCY = 8
+
+# Only the start of a page is kept, so stop downloading after this many bytes
+MAX_PAGE_BYTES = 128 * 1024
+# Compression is negotiated by aiohttp's default Accept-Encoding (gzip/deflate, plus br/zstd when installed)
+PAGE_HEADERS = {'Accept': 'text/html,application/xhtml+xml;q=0.9,*/*;q=0.8'}
+
+# Keep-alive connection pool shared by every request in a run
+POOL_SIZE = 32
+POOL_SIZE_PER_HOST = 16
+DEFAULT_HEADERS = {'User-Agent': 'Mozilla/5.0'}
+
+# In-memory response cache
+CACHE_SIZE = 1024
+CACHE_TTL = 3600  # seconds
+# Official sites rarely change, so site lookups are kept longer under a canonical team key
+SITE_CACHE_SIZE = 2048
+SITE_CACHE_TTL = 86400  # seconds
+_NON_WORD_RE = re.compile(r'\W+')
+
+# Persistent cache shared between CLI runs
+DISK_CACHE_DIR = os.path.expanduser("~/.cache/football-agent")
+
+# Serper result containers and per-item field aliases, in priority order
+_RESULT_KEYS = ("organic", "organic_results", "organic_results_list", "items", "results")
+_TITLE_KEYS = ("title", "name", "heading")
+_LINK_KEYS = ("link", "url", "displayed_link", "source")
+_SNIPPET_KEYS = ("snippet", "description", "snippet_highlighted")
+
+# Regex fallback for HTML cleaning when neither selectolax nor lxml is installed
+_SCRIPT_RE = re.compile(r'<script[^>]*>.*?</script>', re.DOTALL)
+_STYLE_RE = re.compile(r'<style[^>]*>.*?</style>', re.DOTALL)
+_TAG_RE = re.compile(r'<[^>]+>')
+_WS_RE = re.compile(r'\s+')
+
+
+def _cache_key(*parts: Any) -> str:
+    """Stable short hash of JSON-serialisable call inputs."""
+    raw = orjson.dumps(parts, option=orjson.OPT_SORT_KEYS, default=str)
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+def _canonical_team_name(team_name: str) -> str:
+    """Accent-, case- and punctuation-insensitive team key ("Atlético  Madrid." -> "atletico madrid")."""
+    ascii_name = unicodedata.normalize('NFKD', team_name).encode('ascii', 'ignore').decode()
+    tokens = [t for t in _NON_WORD_RE.split(ascii_name.lower()) if t]
+    return ' '.join(tokens) or team_name.strip().lower()
+
+
+def _positional_args(signature: inspect.Signature, self: Any, args: tuple, kwargs: dict) -> tuple:
+    """A call's arguments (minus self) in positional form with defaults applied.
+
+    Keys built from this don't depend on whether arguments were passed by
+    keyword or left at their default.
+    """
+    bound = signature.bind(self, *args, **kwargs)
+    bound.apply_defaults()
+    return bound.args[1:]
+
+
+def memoized(key_func: Callable[..., Any], cache: str = "memo"):
+    """Memoize an async agent method in ``self.<cache>``, keyed by ``key_func(*args)``.
+
+    ``key_func`` receives the method's arguments positionally, however the
+    method was called.
+
+    The pending task is cached rather than the result, so concurrent callers
+    with the same key share a single request. Empty results and exceptions
+    are dropped so they can be retried.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            memo = getattr(self, cache)
+            key = _cache_key(func.__name__, key_func(*_positional_args(signature, self, args, kwargs)))
+            task = memo.get(key)
+            if task is None or task.cancelled():
+                task = asyncio.ensure_future(func(self, *args, **kwargs))
+                memo[key] = task
+            try:
+                result = await task
+            except BaseException:
+                memo.pop(key, None)
+                raise
+            if not result:
+                memo.pop(key, None)
+            return result
+        return wrapper
+    return decorator
+
+
+def ttl_cached(ttl: int = CACHE_TTL, key_func: Optional[Callable[..., Any]] = None):
+    """Persist non-empty results of an async agent method in ``self.cache`` for ``ttl`` seconds.
+
+    The key is built from all arguments unless ``key_func(*args)`` is given;
+    either way arguments are normalised to positional form first.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            call_args = _positional_args(signature, self, args, kwargs)
+            parts = key_func(*call_args) if key_func else list(call_args)
+            key = orjson.dumps([func.__name__, parts], default=str)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+            result = await func(self, *args, **kwargs)
+            if result:
+                self.cache.set(key, result, expire=ttl)
+            return result
+        return wrapper
+    return decorator
+
+
+def _retry_delay(response: aiohttp.ClientResponse, attempt: int) -> float:
+    """Seconds to wait before retrying, honouring Retry-After / X-RateLimit-Reset when present."""
+    headers = response.headers
+    retry_after = headers.get('Retry-After')
+    if retry_after:
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+            except (TypeError, ValueError):
+                delay = 0.0
+        return min(max(delay, 0.0), MAX_BACKOFF)
+    reset = headers.get('X-RateLimit-Reset')
+    if headers.get('X-RateLimit-Remaining') == '0' and reset:
+        try:
+            delay = float(reset)
+            # Some providers send an epoch timestamp, others a delta in seconds
+            if delay > time.time():
+                delay -= time.time()
+            return min(max(delay, 0.0), MAX_BACKOFF)
+        except ValueError:
+            pass
+    return min(BACKOFF_FACTOR * 2 ** attempt, MAX_BACKOFF)
+
+
+def _html_to_text(body: bytes, encoding: str) -> str:
+    """Return the visible text of an HTML document with whitespace collapsed."""
+    if not body.strip():
+        return ''
+    if HTMLParser is not None:
+        tree = HTMLParser(body.decode(encoding, errors='replace'))
+        tree.strip_tags(["script", "style"])
+        root = tree.body or tree.root
+        text = root.text(separator=' ', strip=True) if root is not None else ''
+    elif lxml_html is not None:
+        # lxml gets the raw bytes: decoded str input is rejected when the page
+        # starts with an XML declaration
+        try:
+            parser = lxml_html.HTMLParser(encoding=encoding)
+        except LookupError:  # Python codec name libxml2 doesn't know; let it sniff
+            parser = lxml_html.HTMLParser()
+        try:
+            doc = lxml_html.fromstring(body, parser=parser)
+        except lxml_html.etree.ParserError:  # e.g. only comments/whitespace
+            return ''
+        for node in doc.xpath('//script|//style'):
+            node.drop_tree()
+        text = ' '.join(doc.itertext())
+    else:
+        text = _SCRIPT_RE.sub('', body.decode(encoding, errors='replace'))
+        text = _STYLE_RE.sub('', text)
+        text = _TAG_RE.sub(' ', text)
+    return _WS_RE.sub(' ', text)
+
+
+def _page_encoding(charset: Optional[str]) -> str:
+    """Content-Type charset if Python can decode it, otherwise UTF-8."""
+    try:
+        codecs.lookup(charset)
+    except (LookupError, TypeError):
+        return 'utf-8'
+    return charset
+
+
+def _clean_html(body: bytes, encoding: str) -> str:
+    """Return the first 5000 characters of text from a page prefix."""
+    return _html_to_text(body, encoding)[:5000]
+
 
 class FootballAgent:
     def __init__(self, gemini_key: str, serper_key: str):
@@ -24,14 +239,90 @@ class FootballAgent:
             raise ValueError("SERPER_API_KEY not set.")
         self.gemini_key = gemini_key
         self.serper_key = serper_key
+        # Shared HTTP session and concurrency cap, open only inside connect() (and so run())
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.memo: TTLCache = TTLCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL)
+        self.site_memo: TTLCache = TTLCache(maxsize=SITE_CACHE_SIZE, ttl=SITE_CACHE_TTL)
+        self.cache = diskcache.Cache(DISK_CACHE_DIR)
+        # Per-host rate limiters; bound to the event loop, so they live with the session
+        self.limiters: Optional[Dict[str, AsyncLimiter]] = None
+        # HTML parsing runs here so it overlaps with requests still in flight
+        self.executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+
+    def close(self) -> None:
+        """Shut down the parsing thread pool and close the disk cache."""
+        self.executor.shutdown(wait=True)
+        self.cache.close()
+
+    def __enter__(self) -> "FootballAgent":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    # -------------------- HTTP --------------------
+    @contextlib.asynccontextmanager
+    async def connect(self):
+        """Open the shared HTTP session used by the fetch/search/Gemini coroutines.
+
+        run() does this itself; use ``async with agent.connect():`` to await
+        those coroutines directly.
+        """
+        if self.session is not None:
+            raise RuntimeError("FootballAgent session is already open.")
+        async with client_session(DEFAULT_HEADERS, limit=POOL_SIZE, limit_per_host=POOL_SIZE_PER_HOST) as session:
+            self.session = session
+            self.semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+            self.limiters = {}
+            try:
+                yield self
+            finally:
+                self.session = None
+                self.semaphore = None
+                self.limiters = None
+
+    def _check_session(self) -> None:
+        # Checked before the methods' broad except clauses, which would otherwise
+        # turn a missing session into an empty result.
+        if self.session is None:
+            raise RuntimeError("No open session: call this inside FootballAgent.run() or `async with agent.connect():`.")
+
+    @contextlib.asynccontextmanager
+    async def _request(self, method: str, url: str, **kwargs):
+        """Rate-limited request that retries connection errors and 429/5xx with exponential backoff."""
+        host = urlparse(url).netloc
+        limiter = self.limiters.setdefault(host, AsyncLimiter(RATE_LIMIT_CALLS, RATE_LIMIT_PERIOD))
+        async with self.semaphore:
+            for attempt in range(MAX_RETRIES + 1):
+                await limiter.acquire()
+                try:
+                    response = await self.session.request(method, url, **kwargs)
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                    if attempt == MAX_RETRIES:
+                        raise
+                    await asyncio.sleep(min(BACKOFF_FACTOR * 2 ** attempt, MAX_BACKOFF))
+                    continue
+                if response.status not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                    break
+                delay = _retry_delay(response, attempt)
+                response.release()
+                print(f"[HTTP] {response.status} from {host}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+            try:
+                yield response
+            finally:
+                response.release()
 
     # -------------------- TheSportsDB --------------------
-    def fetch_matches(self, team_name: str, last_n: int = 5) -> List[str]:
+    @ttl_cached()
+    async def fetch_matches(self, team_name: str, last_n: int = 5) -> List[str]:
         """Fetch last N matches using TheSportsDB free API."""
+        self._check_session()
         try:
             search_url = "https://www.thesportsdb.com/api/v1/json/3/searchteams.php"
-            response = requests.get(search_url, params={"t": team_name}, timeout=10)
-            teams_data = response.json()
+            async with self._request("GET", search_url, params={"t": team_name}, timeout=aiohttp.ClientTimeout(total=10)) as response:
+                teams_data = orjson.loads(await response.read())
             if not teams_data.get('teams'):
                 print(f"Team '{team_name}' not found!")
                 return []
@@ -41,8 +332,8 @@ class FootballAgent:
             team_name_full = team['strTeam']
 
             matches_url = "https://www.thesportsdb.com/api/v1/json/3/eventslast.php"
-            matches_response = requests.get(matches_url, params={"id": team_id}, timeout=10)
-            matches_data = matches_response.json()
+            async with self._request("GET", matches_url, params={"id": team_id}, timeout=aiohttp.ClientTimeout(total=10)) as matches_response:
+                matches_data = orjson.loads(await matches_response.read())
             if not matches_data.get('results'):
                 print(f"No recent matches found for {team_name_full}")
                 return []
@@ -61,13 +352,15 @@ class FootballAgent:
             return []
 
     # -------------------- Serper --------------------
-    def _post_serper(self, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    @memoized(lambda params: ("https://google.serper.dev/search", params))
+    async def _post_serper(self, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         url = "https://google.serper.dev/search"
-        headers = {"X-API-KEY": self.serper_key}
+        headers = {"X-API-KEY": self.serper_key, "Content-Type": "application/json"}
+        self._check_session()
         try:
-            resp = requests.post(url, headers=headers, json=params, timeout=15)
-            resp.raise_for_status()
-            return resp.json()
+            async with self._request("POST", url, headers=headers, data=orjson.dumps(params), timeout=aiohttp.ClientTimeout(total=15)) as resp:
+                resp.raise_for_status()
+                return orjson.loads(await resp.read())
         except Exception as e:
             print(f"[Serper] request error: {e}")
             return None
@@ -75,64 +368,72 @@ class FootballAgent:
     def _extract_organic_from_response(self, data: Dict[str, Any]) -> List[Dict[str, Any]]:
         if not data:
             return []
-        for key in ("organic", "organic_results", "organic_results_list", "items", "results"):
-            block = data.get(key)
-            if isinstance(block, list) and block:
-                out = []
-                for item in block:
-                    title = item.get("title") or item.get("name") or item.get("heading") or ""
-                    link = item.get("link") or item.get("url") or item.get("displayed_link") or item.get("source")
-                    snippet = item.get("snippet") or item.get("description") or item.get("snippet_highlighted") or ""
-                    out.append({"title": title, "link": link, "snippet": snippet, "raw": item})
-                return out
-        return []
-
-    def search_official_site(self, team_name: str) -> Optional[str]:
+        block = next((data[key] for key in _RESULT_KEYS if isinstance(data.get(key), list) and data[key]), None)
+        if not block:
+            return []
+        out = []
+        for item in block:
+            title = next((item[k] for k in _TITLE_KEYS if item.get(k)), "")
+            link = next((item[k] for k in _LINK_KEYS if item.get(k)), None)
+            snippet = next((item[k] for k in _SNIPPET_KEYS if item.get(k)), "")
+            out.append({"title": title, "link": link, "snippet": snippet})
+        return out
+
+    @ttl_cached(SITE_CACHE_TTL, key_func=_canonical_team_name)
+    @memoized(_canonical_team_name, cache="site_memo")
+    async def search_official_site(self, team_name: str) -> Optional[str]:
         """Return the first website link from Serper search results."""
         query = f"official website {team_name}"
         params = {"q": query, "num": 10}
-        data = self._post_serper(params)
+        data = await self._post_serper(params)
         results = self._extract_organic_from_response(data)
         if results:
             return results[0]["link"]
         return None
 
     # -------------------- Page content --------------------
-    def extract_page_content(self, url: str) -> str:
-        """Extract textual content from a webpage (simple HTML cleaning)."""
+    @ttl_cached()
+    @memoized(lambda url: url)
+    async def extract_page_content(self, url: str) -> str:
+        """Extract textual content from a webpage."""
+        self._check_session()
         try:
-            headers = {'User-Agent': 'Mozilla/5.0'}
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
-            content = response.text
-            content = re.sub(r'<script[^>]*>.*?</script>', '', content, flags=re.DOTALL)
-            content = re.sub(r'<style[^>]*>.*?</style>', '', content, flags=re.DOTALL)
-            content = re.sub(r'<[^>]+>', ' ', content)
-            content = re.sub(r'\s+', ' ', content)
-            return content[:5000]
+            async with self._request("GET", url, headers=PAGE_HEADERS, timeout=aiohttp.ClientTimeout(total=10)) as response:
+                response.raise_for_status()
+                raw = bytearray()
+                while len(raw) < MAX_PAGE_BYTES:
+                    chunk = await response.content.read(MAX_PAGE_BYTES - len(raw))
+                    if not chunk:
+                        break
+                    raw += chunk
+                encoding = _page_encoding(response.charset)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, _clean_html, bytes(raw), encoding)
         except Exception as e:
             print(f"Error extracting page content from {url}: {e}")
             return ""
 
     # -------------------- Gemini LLM --------------------
-    def call_gemini_api(self, prompt: str) -> str:
+    @memoized(lambda prompt: prompt)
+    async def call_gemini_api(self, prompt: str) -> str:
         GEMINI_API_URL = f"https://generativelanguage.googleapis.com/v1/models/gemini-2.0-flash:generateContent?key={self.gemini_key}"
         headers = {"Content-Type": "application/json"}
         data = {
             "contents": [{"parts": [{"text": prompt}]}],
             "generationConfig": {"temperature": 0.3, "maxOutputTokens": 3000}
         }
+        self._check_session()
         try:
-            res = requests.post(GEMINI_API_URL, headers=headers, json=data)
-            res.raise_for_status()
-            result = res.json()
+            async with self._request("POST", GEMINI_API_URL, headers=headers, data=orjson.dumps(data)) as res:
+                res.raise_for_status()
+                result = orjson.loads(await res.read())
             return result["candidates"][0]["content"]["parts"][0]["text"].strip()
         except Exception as e:
             print(f"Error calling Gemini: {e}")
             return ""
 
     # -------------------- Analyze --------------------
-    def analyze_matches(self, match_list: List[str], team_name: str, website_url: str) -> str:
+    async def analyze_matches(self, match_list: List[str], team_name: str, website_url: str) -> str:
         if not match_list:
             return f"No match data found for {team_name} from {website_url}."
         prompt = f"""
@@ -152,16 +453,24 @@ TASKS (return only valid JSON):
 2) Include overall "team_summary" with "avg_insights" and "priority_actions".
 3) Return only valid JSON.
 """
-        return self.call_gemini_api(prompt)
+        return await self.call_gemini_api(prompt)
 
     # -------------------- Run agent --------------------
-    def run(self, team_name: str, last_n: int = 5) -> str:
-        match_list = self.fetch_matches(team_name, last_n)
-        website_url = self.search_official_site(team_name) or "N/A"
-        page_content = self.extract_page_content(website_url) if website_url != "N/A" else ""
-        feedback_json = self.analyze_matches(match_list, team_name, website_url)
+    async def _run_async(self, team_name: str, last_n: int = 5) -> str:
+        async with self.connect():
+            # Match history and the site search are independent roots; the page fetch
+            # starts as soon as the site is known, without waiting for the matches.
+            matches_task = asyncio.create_task(self.fetch_matches(team_name, last_n))
+            website_url = await self.search_official_site(team_name) or "N/A"
+            page_task = asyncio.create_task(self.extract_page_content(website_url)) if website_url != "N/A" else None
+            match_list = await matches_task
+            feedback_json = await self.analyze_matches(match_list, team_name, website_url)
+            page_content = await page_task if page_task else ""
         return feedback_json
 
+    def run(self, team_name: str, last_n: int = 5) -> str:
+        return asyncio.run(self._run_async(team_name, last_n))
+
 
 # -------------------- CLI Entry --------------------
 if __name__ == "__main__":
@@ -169,8 +478,8 @@ if __name__ == "__main__":
         print("Please set GEMINI_API_KEY and SERPER_API_KEY in your environment or .env")
         sys.exit(1)
 
-    agent = FootballAgent(GEMINI_API_KEY, SERPER_API_KEY)
     team_name = sys.argv[1] if len(sys.argv) > 1 else "Barcelona"
     last_n = int(sys.argv[2]) if len(sys.argv) > 2 else 5
-    result = agent.run(team_name, last_n)
+    with FootballAgent(GEMINI_API_KEY, SERPER_API_KEY) as agent:
+        result = agent.run(team_name, last_n)
     print(result)
@@ -0,0 +1,31 @@
+import contextlib
+from typing import AsyncIterator, Dict, Optional
+
+import aiohttp
+
+# Cache DNS answers for 5 min instead of aiohttp's 10 s default; long sessions still re-resolve after that
+DNS_CACHE_TTL = 300  # seconds
+
+
+def _dns_resolver() -> aiohttp.abc.AbstractResolver:
+    """c-ares resolver when aiodns is installed, otherwise aiohttp's threaded getaddrinfo."""
+    try:
+        return aiohttp.AsyncResolver()
+    except RuntimeError:
+        return aiohttp.ThreadedResolver()
+
+
+@contextlib.asynccontextmanager
+async def client_session(headers: Optional[Dict[str, str]] = None, **connector_kwargs) -> AsyncIterator[aiohttp.ClientSession]:
+    """aiohttp session with a DNS-caching connector; ``connector_kwargs`` go to TCPConnector.
+
+    The connector does not close a resolver it was handed, so it is closed here
+    once the session is gone.
+    """
+    resolver = _dns_resolver()
+    try:
+        connector = aiohttp.TCPConnector(resolver=resolver, ttl_dns_cache=DNS_CACHE_TTL, **connector_kwargs)
+        async with aiohttp.ClientSession(connector=connector, headers=headers) as session:
+            yield session
+    finally:
+        await resolver.close()
@@ -1,22 +1,141 @@
-import json
 import random
-import time
-import requests
+import hashlib
+import functools
+import asyncio
+import aiohttp
+import numpy as np
+import orjson
+from cachetools import TTLCache
+from http_session import client_session
+
+MAX_CONCURRENCY = 8  # Gemini calls in flight at once when the batch API is unavailable
+NO_RECOMMENDATION = "⚠️ No recommendation generated."
+
+# Gemini Batch API (offline jobs: cheaper per token, one round trip for all minutes)
+GEMINI_API_BASE = "https://generativelanguage.googleapis.com"
+BATCH_POLL_INTERVAL = 10  # seconds
+BATCH_TIMEOUT = 30 * 60  # give up on the job and call generateContent directly after this
+# Network, HTTP and malformed-response errors that make batch mode fall back to single calls
+BATCH_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, ValueError, KeyError, IndexError)
+
+# Identical prompts (e.g. re-running a backtest) reuse the earlier answer for an hour
+_gemini_cache = TTLCache(maxsize=1024, ttl=3600)
+
 
 # === Gemini API Call (direct HTTP) ===
-def call_gemini_api(prompt, gemini_api_key):
-    url = f"https://generativelanguage.googleapis.com/v1/models/gemini-2.0-flash:generateContent?key={gemini_api_key}"
+async def call_gemini_api(prompt, gemini_api_key, session):
+    prompt_hash = hashlib.blake2b(prompt.encode(), digest_size=16).hexdigest()
+    task = _gemini_cache.get(prompt_hash)
+    if task is None or task.cancelled():
+        task = asyncio.ensure_future(_call_gemini_uncached(prompt, gemini_api_key, session))
+        _gemini_cache[prompt_hash] = task
+    try:
+        result = await task
+    except Exception:
+        _gemini_cache.pop(prompt_hash, None)
+        raise
+    if result == NO_RECOMMENDATION:
+        # Same rule as agent.memoized: don't replay a failed answer, let it be retried
+        _gemini_cache.pop(prompt_hash, None)
+    return result
+
+
+async def _call_gemini_uncached(prompt, gemini_api_key, session):
+    url = f"{GEMINI_API_BASE}/v1/models/gemini-2.0-flash:generateContent?key={gemini_api_key}"
+    headers = {"Content-Type": "application/json"}
+    payload = {"contents": [{"parts": [{"text": prompt}]}]}
+
+    async with session.post(url, headers=headers, data=orjson.dumps(payload)) as response:
+        response.raise_for_status()
+        result = orjson.loads(await response.read())
+
+    return _response_text(result)
+
+
+async def stream_gemini_api(prompt, gemini_api_key, session):
+    """Yield response text as Gemini generates it (server-sent events from streamGenerateContent)."""
+    url = f"{GEMINI_API_BASE}/v1/models/gemini-2.0-flash:streamGenerateContent?alt=sse&key={gemini_api_key}"
     headers = {"Content-Type": "application/json"}
     payload = {"contents": [{"parts": [{"text": prompt}]}]}
 
-    response = requests.post(url, headers=headers, json=payload)
-    response.raise_for_status()
-    result = response.json()
+    async with session.post(url, headers=headers, data=orjson.dumps(payload)) as response:
+        response.raise_for_status()
+        async for line in response.content:
+            if not line.startswith(b"data:"):
+                continue
+            try:
+                text = orjson.loads(line[5:])["candidates"][0]["content"]["parts"][0]["text"]
+            except (KeyError, IndexError, ValueError):  # ValueError: malformed JSON chunk
+                continue
+            if text:
+                yield text
+
 
+def _response_text(result):
     try:
         return result["candidates"][0]["content"]["parts"][0]["text"]
     except (KeyError, IndexError):
-        return "⚠️ No recommendation generated."
+        return NO_RECOMMENDATION
+
+
+async def _cancel_gemini_batch(name, gemini_api_key, session):
+    # Best effort: stop paying for a job whose prompts are about to be re-sent one by one
+    url = f"{GEMINI_API_BASE}/v1beta/{name}:cancel?key={gemini_api_key}"
+    try:
+        async with session.post(url) as response:
+            response.raise_for_status()
+        print(f"Cancelled Gemini batch {name}")
+    except BATCH_ERRORS as e:
+        print(f"Could not cancel Gemini batch {name}: {e}")
+
+
+async def call_gemini_batch(prompts, gemini_api_key, session):
+    """Run prompts as one Gemini batch job; returns texts in prompt order, or None if the job didn't succeed.
+
+    A job that is still running when polling times out or fails is cancelled.
+    """
+    url = f"{GEMINI_API_BASE}/v1beta/models/gemini-2.0-flash:batchGenerateContent?key={gemini_api_key}"
+    headers = {"Content-Type": "application/json"}
+    batch_requests = [
+        {"request": {"contents": [{"parts": [{"text": prompt}]}]}, "metadata": {"key": str(i)}}
+        for i, prompt in enumerate(prompts)
+    ]
+    payload = {"batch": {"display_name": "football-recommender", "input_config": {"requests": {"requests": batch_requests}}}}
+
+    async with session.post(url, headers=headers, data=orjson.dumps(payload)) as response:
+        response.raise_for_status()
+        job = orjson.loads(await response.read())
+    name = job["name"]
+
+    status_url = f"{GEMINI_API_BASE}/v1beta/{name}?key={gemini_api_key}"
+    deadline = asyncio.get_running_loop().time() + BATCH_TIMEOUT
+    try:
+        while not job.get("done"):
+            if asyncio.get_running_loop().time() > deadline:
+                print(f"Gemini batch {name} still running after {BATCH_TIMEOUT}s")
+                await _cancel_gemini_batch(name, gemini_api_key, session)
+                return None
+            await asyncio.sleep(BATCH_POLL_INTERVAL)
+            async with session.get(status_url) as response:
+                response.raise_for_status()
+                job = orjson.loads(await response.read())
+    except BATCH_ERRORS:
+        await _cancel_gemini_batch(name, gemini_api_key, session)
+        raise
+
+    state = job.get("metadata", {}).get("state")
+    if "error" in job or "response" not in job or state not in (None, "BATCH_STATE_SUCCEEDED"):
+        print(f"Gemini batch {name} ended in {state or job.get('error')}")
+        return None
+
+    inlined = job["response"].get("inlinedResponses", [])
+    if isinstance(inlined, dict):  # REST nests the list one level deeper
+        inlined = inlined.get("inlinedResponses", [])
+    texts = [NO_RECOMMENDATION] * len(prompts)
+    for position, item in enumerate(inlined):
+        index = int(item.get("metadata", {}).get("key", position))
+        texts[index] = _response_text(item.get("response", {}))
+    return texts
 
 
 # === ML Stub (replace with your real ML model) ===
@@ -29,10 +148,28 @@ def predict_outcome(live_stats):
 
 
 # === LLM Recommendation Function ===
-def llm_recommendation(live_stats, agent_insights, ml_prediction, gemini_api_key):
-    prompt = f"""
+def build_static_prompt(insights_json):
+    # Everything that stays the same for the whole match; built once and reused as the
+    # prompt prefix so providers with prefix caching can reuse it across ticks.
+    return f"""
     You are a professional football performance analyst.
 
+    🔹 Insights from the last 5 matches (JSON from analysis agent): 
+    {insights_json}
+
+    Task:
+    - Provide 2–3 **tactical recommendations** for the coach.
+    - Base them BOTH on:
+        1. Current real-time stats (match context below).
+        2. Weaknesses, strong points, and successful/failed tactics observed in the last 5 games.
+    - Be concise and actionable (avoid generic advice).
+    - Highlight urgent risks (cards, fatigue, momentum).
+    - Suggest adjustments (substitutions, formations, pressing, attack/defense balance).
+    """
+
+
+def build_recommendation_prompt(live_stats, static_prompt, ml_prediction):
+    return static_prompt + f"""
     🔹 Match context:
     - Minute: {live_stats['minute']}
     - Score: {live_stats['team']} {live_stats['score']} - {live_stats['opponent_score']} {live_stats['opponent']}
@@ -42,54 +179,113 @@ def llm_recommendation(live_stats, agent_insights, ml_prediction, gemini_api_key
     - Red cards: {live_stats['red_cards']}
     - Avg player speed: {live_stats['avg_player_speed']} km/h
 
-    🔹 Insights from the last 5 matches (JSON from analysis agent): 
-    {json.dumps(agent_insights, indent=2)}
-
     🔹 ML prediction (probabilities):
     {ml_prediction}
-
-    Task:
-    - Provide 2–3 **tactical recommendations** for the coach.
-    - Base them BOTH on:
-        1. Current real-time stats.
-        2. Weaknesses, strong points, and successful/failed tactics observed in the last 5 games.
-    - Be concise and actionable (avoid generic advice).
-    - Highlight urgent risks (cards, fatigue, momentum).
-    - Suggest adjustments (substitutions, formations, pressing, attack/defense balance).
     """
 
-    return call_gemini_api(prompt, gemini_api_key).strip()
 
+async def llm_recommendation(live_stats, static_prompt, ml_prediction, gemini_api_key, session):
+    prompt = build_recommendation_prompt(live_stats, static_prompt, ml_prediction)
+    return (await call_gemini_api(prompt, gemini_api_key, session)).strip()
 
-# === Main Loop ===
-def run_realtime_recommender(team, opponent, agent_json_path, gemini_api_key, duration=3):
-    with open(agent_json_path, "r") as f:
-        agent_data = json.load(f)
 
-    team_insights = agent_data  # whole JSON (already contains weaknesses, strengths, tactics, feedback)
+# === Insights loading ===
+@functools.lru_cache(maxsize=8)
+def load_insights(agent_json_path):
+    # Parsed once per report path and shared between recommenders; treat as read-only
+    with open(agent_json_path, "rb") as f:
+        return orjson.loads(f.read())
 
-    print(f"⚽ Starting LLM-based recommender for {team} vs {opponent}...\n")
 
-    for minute in range(5, (duration * 5) + 1, 5):
-        # Simulated real-time stats (replace with your live API feed)
-        live_stats = {
-            "minute": f"{minute}:00",
-            "team": team,
-            "opponent": opponent,
-            "score": random.randint(0, 2),
-            "opponent_score": random.randint(0, 2),
-            "possession": random.randint(40, 70),
-            "shots_on_target": random.randint(0, 6),
-            "yellow_cards": random.randint(0, 5),
-            "red_cards": random.randint(0, 1),
-            "avg_player_speed": round(random.uniform(5.5, 8.5), 2)
-        }
+@functools.lru_cache(maxsize=8)
+def load_static_prompt(agent_json_path):
+    # whole JSON (already contains weaknesses, strengths, tactics, feedback), serialized once
+    insights_json = orjson.dumps(load_insights(agent_json_path), option=orjson.OPT_INDENT_2).decode()
+    return build_static_prompt(insights_json)
+
+
+# === Main Loop ===
+def simulate_live_stats(team, opponent, minutes, rng=None):
+    # Simulated real-time stats (replace with your live API feed), drawn for every minute at once
+    rng = rng or np.random.default_rng()
+    n = len(minutes)
+    columns = {
+        "score": rng.integers(0, 3, size=n),
+        "opponent_score": rng.integers(0, 3, size=n),
+        "possession": rng.integers(40, 71, size=n),
+        "shots_on_target": rng.integers(0, 7, size=n),
+        "yellow_cards": rng.integers(0, 6, size=n),
+        "red_cards": rng.integers(0, 2, size=n),
+        "avg_player_speed": rng.uniform(5.5, 8.5, size=n).round(2),
+    }
+    columns = {name: values.tolist() for name, values in columns.items()}
+    return [
+        {"minute": f"{minute}:00", "team": team, "opponent": opponent,
+         **{name: values[i] for name, values in columns.items()}}
+        for i, minute in enumerate(minutes)
+    ]
+
 
+async def _recommend_realtime(team, opponent, minutes, static_prompt, gemini_api_key, session):
+    for minute, live_stats in zip(minutes, simulate_live_stats(team, opponent, minutes)):
         ml_pred = predict_outcome(live_stats)
-        recs = llm_recommendation(live_stats, team_insights, ml_pred, gemini_api_key)
+        prompt = build_recommendation_prompt(live_stats, static_prompt, ml_pred)
+
+        # Print the recommendation as it is generated instead of waiting for the full answer
+        print(f"--- Minute {minute} ---")
+        received = False
+        async for chunk in stream_gemini_api(prompt, gemini_api_key, session):
+            print(chunk if received else chunk.lstrip(), end="", flush=True)
+            received = True
+        print("\n" if received else NO_RECOMMENDATION + "\n")
+
+        await asyncio.sleep(2)  # simulate real-time delay
+
+
+async def _recommend_batch(team, opponent, minutes, static_prompt, gemini_api_key, session):
+    # Backtest: every minute bucket is independent, so submit them all as one batch job
+    stats = simulate_live_stats(team, opponent, minutes)
+    ml_preds = [predict_outcome(live_stats) for live_stats in stats]
+    prompts = [build_recommendation_prompt(live_stats, static_prompt, ml_pred) for live_stats, ml_pred in zip(stats, ml_preds)]
+    try:
+        results = await call_gemini_batch(prompts, gemini_api_key, session)
+    except BATCH_ERRORS as e:
+        print(f"Gemini batch request failed: {type(e).__name__}: {e}")
+        results = None
+
+    if results is None:
+        # Fall back to individual generateContent calls, several in flight at once
+        print("Falling back to individual Gemini calls...")
+        semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
 
+        async def recommend(live_stats, ml_pred):
+            async with semaphore:
+                return await llm_recommendation(live_stats, static_prompt, ml_pred, gemini_api_key, session)
+
+        results = await asyncio.gather(*(recommend(live_stats, ml_pred) for live_stats, ml_pred in zip(stats, ml_preds)))
+
+    for minute, recs in zip(minutes, results):
         print(f"--- Minute {minute} ---")
-        print(recs)
+        print(recs.strip())
         print()
 
-        time.sleep(2)  # simulate real-time delay
+
+async def _run_recommender_async(team, opponent, static_prompt, gemini_api_key, duration, mode):
+    minutes = list(range(5, (duration * 5) + 1, 5))
+    async with client_session(limit_per_host=64) as session:
+        if mode == "batch":
+            await _recommend_batch(team, opponent, minutes, static_prompt, gemini_api_key, session)
+        else:
+            await _recommend_realtime(team, opponent, minutes, static_prompt, gemini_api_key, session)
+
+
+def run_realtime_recommender(team, opponent, agent_json_path, gemini_api_key, duration=3, mode="realtime"):
+    """Run the recommender; mode="batch" submits all minute buckets as one Gemini batch job (backtests)."""
+    if mode not in ("realtime", "batch"):
+        raise ValueError(f"Unknown mode: {mode!r} (expected 'realtime' or 'batch')")
+
+    static_prompt = load_static_prompt(agent_json_path)
+
+    print(f"⚽ Starting LLM-based recommender for {team} vs {opponent}...\n")
+
+    asyncio.run(_run_recommender_async(team, opponent, static_prompt, gemini_api_key, duration, mode))